@@ -3,18 +3,41 @@
 # Use of this source code is governed by the Apache License 2.0
 # that can be found in the COPYING file.
 
-import base64
+import os
+import sys
+
+# Starting EOS 4.30.1 the EOS modules are not available to python2, which is what
+# #!/usr/bin/python runs this script with. Detect that before any other imports and
+# re-execute with python3 right away, see IMPORT HANDLING below for the other cases.
+if sys.version_info < (3,) and os.path.exists( '/usr/bin/python3' ):
+   import pkgutil
+   if pkgutil.find_loader( 'Cell' ) is None:
+      os.execl( '/usr/bin/python3', 'python3', os.path.abspath( __file__ ) )
+
+import atexit
 import datetime
-import json
 import logging
 import logging.handlers
-import os
+import re
+import select
+import shutil
 import signal
 import socket
 import subprocess
-import sys
 import time
 
+# pybase64 and orjson are faster drop-in replacements for base64 and json,
+# use them when available on the device and fall back to the stdlib otherwise
+try:
+   import pybase64 as base64
+except ImportError:
+   import base64
+
+try:
+   import orjson as json
+except ImportError:
+   import json
+
 ##############  USER INPUT  ##############
 # Note: If you are saving the file on windows, please make sure to use linux (LF) as newline.
 # By default, windows uses (CR LF), you need to convert the newline char to linux (LF).
@@ -64,22 +87,43 @@ TOKEN_FILE_PATH = "/tmp/token.tok"
 BOOT_SCRIPT_PATH = "/tmp/bootstrap-script"
 REDIRECTOR_PATH = "api/v3/services/arista.redirector.v1.AssignmentService/GetOne"
 VERSION = "1.0.0"
+NTP_SYNC_TIMEOUT = 300
+NTP_FAST_POLLS = 10
+LOG_BUFFER_CAPACITY = 64
+TERMINATTR_TIMEOUT = 60
 
 ##############  HELPER FUNCTIONS  ##############
 proxies = { "https" : cvproxy, "http" : cvproxy }
 
 logger = None
+logBuffer = None
 def setupLogger():
-   global logger
+   global logger, logBuffer
    logger = logging.getLogger("customBootstrap")
    logger.setLevel(logging.DEBUG)
    try:
       handler = logging.handlers.SysLogHandler(address='/dev/log')
-      logger.addHandler(handler)
+      # messages are buffered and written to syslog in batches, the buffer is
+      # flushed when full, at every step boundary and before any long wait, at
+      # exit or SIGTERM, and before handing control to another process
+      logBuffer = logging.handlers.MemoryHandler(LOG_BUFFER_CAPACITY,
+                                                 flushLevel=logging.CRITICAL + 1,
+                                                 target=handler)
+      logger.addHandler(logBuffer)
+      atexit.register(flushLogger)
    except socket.error:
       print( "error setting up logger" )
       logger = None
 
+def flushLogger():
+   if logBuffer:
+      logBuffer.flush()
+
+# the default SIGTERM action skips atexit, which would drop buffered log messages
+def exitOnSigterm( sig, frame ):
+   flushLogger()
+   sys.exit( 127 + signal.SIGTERM )
+
 def log(msg):
    """ Print message to terminal and log if logging is up"""
    print( msg )
@@ -87,9 +131,28 @@ def log(msg):
       logger.critical(msg)
 
 def monitorNtpSync():
-   timeInterval = 10
+   # ntp-wait blocks until ntpd reports sync, returning as soon as that happens
+   # instead of sleeping for a fixed interval between polls
+   log("Waiting for NTP sync.")
+   flushLogger()
+   try:
+      ntpWaitInfo = subprocess.call( [ "ntp-wait", "-n", str( NTP_SYNC_TIMEOUT ), "-s", "1" ] )
+   except OSError:
+      ntpWaitInfo = None
+   if ntpWaitInfo is not None:
+      log("NTP sync status - %s" % str(ntpWaitInfo))
+      if ntpWaitInfo != 0:
+         raise Exception("NTP sync failed. Timing out.")
+      log("NTP sync complete.")
+      return
+
+   # ntp-wait is not available, fall back to polling ntpstat every second for
+   # the first few polls, then backing off until the timeout is reached
+   timeInterval = 1
    expo = 2
-   for i in range(5):
+   deadline = time.time() + NTP_SYNC_TIMEOUT
+   polls = 0
+   while True:
       log("Polling NTP status.")
       try:
          ntpStatInfo = subprocess.call(["ntpstat"])
@@ -99,22 +162,32 @@ def monitorNtpSync():
       if ntpStatInfo == 0:
          log("NTP sync complete.")
          return
-      time.sleep(timeInterval)
-      timeInterval *= expo
+      if time.time() >= deadline:
+         break
+      flushLogger()
+      time.sleep(max(0, min(timeInterval, deadline - time.time())))
+      polls += 1
+      if polls >= NTP_FAST_POLLS:
+         timeInterval *= expo
    raise Exception("NTP sync failed. Timing out.")
 
 def getExpiryFromToken(token):
    try:
       # jwt token has 3 parts (header, payload, sign) seperated by a '.'
       # payload has 'exp' field which contains the token expiry time in epoch
+      # payload is base64url encoded with the trailing padding stripped
       token_payload = token.split(".")[1]
-      token_payload_decoded = str(base64.b64decode(token_payload + "==").decode("utf-8"))
+      padding = b"=" * (-len(token_payload) % 4)
+      token_payload_decoded = base64.urlsafe_b64decode(token_payload.encode("ascii") + padding)
       payload = json.loads(token_payload_decoded)
       return payload["exp"], True
    except:
       log("Could not parse the enrollment token. Continuing with ZTP.")
       return -1, False
 
+# CLI errors are reported on lines starting with '%'
+CLI_ERROR_REGEX = re.compile(r'^%', re.M)
+
 # Class is used to execute commands in EOS shell
 class CliManager(object):
    FAST_CLI_BINARY = "/usr/bin/FastCli"
@@ -123,51 +196,52 @@ class CliManager(object):
       self.confidenceCheck()
 
    def confidenceCheck(self):
-      assert os.path.isfile(self.fastCliBinary), "FastCli Binary Not Found"
+      assert FAST_CLI_AVAILABLE, "FastCli Binary Not Found"
 
    def runCommands(self, cmdList):
-      cmdOutput = ""
-      rc = 0
-      errMsg = ""
-      try:
-         cmds = "\n".join(cmdList)
-         cmdOutput = subprocess.check_output(
-            "echo -e '" + cmds + "' | " + self.fastCliBinary, shell=True, stderr=subprocess.STDOUT,
-            universal_newlines=True )
-      except subprocess.CalledProcessError as e:
-         rc = e.returncode
-         errMsg = e.output
+      # commands are written directly to the stdin of FastCli, avoiding the
+      # extra shell and echo processes along with their quoting issues
+      cmds = "\n".join(cmdList)
+      proc = subprocess.Popen( [ self.fastCliBinary ], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               universal_newlines=True )
+      cmdOutput, _ = proc.communicate( cmds + "\n" )
+      if proc.returncode:
+         errMsg = cmdOutput
+         log("Error running commands %s errMsg %s" % (cmds, errMsg))
+         return (proc.returncode, errMsg)
+
+      if cmdOutput and CLI_ERROR_REGEX.search(cmdOutput):
+         errMsg = cmdOutput
          log("Error running commands %s errMsg %s" % (cmds, errMsg))
-         return (rc, errMsg)
-
-      if cmdOutput:
-         for line in cmdOutput.split('\n'):
-            if line.startswith('%'):
-               errMsg = cmdOutput
-               log("Error running commands %s errMsg %s" % (cmds, errMsg))
-               return(1, errMsg)
+         return(1, errMsg)
       return (0, cmdOutput)
 
+# the FastCli binary is probed once at load time rather than per CliManager
+FAST_CLI_AVAILABLE = os.path.isfile(CliManager.FAST_CLI_BINARY)
+
+# a single CliManager is shared by all the callers, created on first use
+cliManager = None
+def getCliManager():
+   global cliManager
+   if cliManager is None:
+      cliManager = CliManager()
+   return cliManager
+
 # stops and restarts ntp with a specified ntp server
 def configureAndRestartNTP(ntpServer):
-   cli = CliManager()
+   cli = getCliManager()
 
-   # Command to stop the ntp process
-   stopNtp = [ 'en', 'configure', 'no ntp', 'exit' ]
-   output, err = cli.runCommands( stopNtp )
-   if output != 0:
-      log("Trying to run commands [en, configure, no ntp, exit]")
-      log("Output: %s, Error %s" % (str(output), str(err)))
-      log("NTP server could not be stopped. Aborting")
-      raise Exception("NTP server could not be stopped, error:{}. Aborting".format(str(err)))
-
-   # Command to configure and restart ntp process.
+   # Commands to stop the ntp process, then configure and restart it, sent to
+   # FastCli as a single batch.
    # Note: iburst flag is added for faster synchronization
-   configNtp = ['en','configure', 'ntp server {} prefer iburst'.format(ntpServer),'exit']
+   configNtp = [ 'en', 'configure', 'no ntp',
+                 'ntp server {} prefer iburst'.format(ntpServer), 'exit' ]
    output, err = cli.runCommands(configNtp)
 
    if output != 0:
-      log("Trying to run commands [en, configure, ntp server {} prefer iburst exit".format(ntpServer))
+      log("Trying to run commands [en, configure, no ntp, ntp server {} prefer iburst, exit]"
+          .format(ntpServer))
       log("Output: %s, Error %s" % (str(output), str(err)))
       log("Could not restart NTP server. Aborting")
       raise Exception("Could not restart NTP server, output:{}. Aborting".format(str(err)))
@@ -177,20 +251,58 @@ def configureAndRestartNTP(ntpServer):
    monitorNtpSync()
 
 
+# compiled KEY=VALUE regexes used by getValueFromFile, keyed by KEY
+valueRegexes = {}
+
 # Given a filepath and a key, getValueFromFile searches for key=VALUE in it
 # and returns the found value without any whitespaces. In case no key specified,
 # gives the first string in the first line of the file.
 def getValueFromFile( filename, key ):
+   with open( filename, "r" ) as f:
+      data = f.read( 64 * 1024 )
    if not key:
-      with open( filename, "r" ) as f:
-         return f.readline().split()[ 0 ]
-   else:
-      with open( filename, "r" ) as f:
-         lines = f.readlines()
-         for line in lines:
-            if key in line :
-               return line.split( "=" )[ 1 ].rstrip( "\n" )
-   return None
+      return data.split( None, 1 )[ 0 ]
+   regex = valueRegexes.get( key )
+   if regex is None:
+      regex = re.compile( r"^" + re.escape( key ) + r"=(.*)$", re.M )
+      valueRegexes[ key ] = regex
+   match = regex.search( data )
+   return match.group( 1 ) if match else None
+
+
+class CommandTimeout( Exception ):
+   def __init__( self, output ):
+      super( CommandTimeout, self ).__init__( "command timed out" )
+      self.output = output
+
+# Runs the given argv list without a shell and returns its output, raising
+# CommandTimeout if it does not finish within timeout seconds.
+# python2 subprocess has no timeout support, so there the timeout utility is
+# used instead, which exits with 124 when the command is killed.
+def checkOutputWithTimeout( args, timeout ):
+   if sys.version_info >= (3,):
+      try:
+         return subprocess.check_output( args, stderr=subprocess.STDOUT, timeout=timeout )
+      except subprocess.TimeoutExpired as e: # pylint: disable=no-member
+         raise CommandTimeout( e.output )
+   try:
+      return subprocess.check_output( [ "timeout", "%ds" % timeout ] + args,
+                                      stderr=subprocess.STDOUT )
+   except subprocess.CalledProcessError as e:
+      if e.returncode == 124: # timeout
+         raise CommandTimeout( e.output )
+      raise
+
+
+# Returns a pidfd referring to the process with the given pid, or None when
+# pidfds are not supported by the python version or the kernel
+def openPidfd( pid ):
+   if not hasattr( os, "pidfd_open" ):
+      return None
+   try:
+      return os.pidfd_open( pid ) # pylint: disable=no-member
+   except OSError:
+      return None
 
 
 def tryImageUpgrade( e ):
@@ -198,18 +310,33 @@ def tryImageUpgrade( e ):
    if eosUrl == "":
       log("Specify eosUrl for EOS version upgrade")
       raise( e )
-   subprocess.call( [ "mv", "/mnt/flash/EOS.swi", "/mnt/flash/EOS.swi.bak" ] )
+   # os.rename is used instead of os.replace as the latter is not present in python2,
+   # both are atomic and overwrite the destination on POSIX
+   try:
+      os.rename( "/mnt/flash/EOS.swi", "/mnt/flash/EOS.swi.bak" )
+   except OSError as err:
+      log("Failed to back up current swi, err - %s" % err)
    try:
-      cmd = "wget {} -O /mnt/flash/EOS.swi; sudo ip netns exec default /usr/bin/FastCli \
-         -p15 -G -A -c $'configure\nboot system flash:/EOS.swi'".format(eosUrl)
-      subprocess.check_output( cmd, shell=True, stderr=subprocess.STDOUT )
+      subprocess.check_output( [ "wget", eosUrl, "-O", "/mnt/flash/EOS.swi" ],
+                               stderr=subprocess.STDOUT )
+      subprocess.check_output( [ "sudo", "ip", "netns", "exec", "default", "/usr/bin/FastCli",
+                                 "-p15", "-G", "-A", "-c",
+                                 "configure\nboot system flash:/EOS.swi" ],
+                               stderr=subprocess.STDOUT )
    except subprocess.CalledProcessError as err:
       # If the link to eosUrl specified is incorrect, then revert back to the older version
-      subprocess.call( [ "mv", "/mnt/flash/EOS.swi.bak", "/mnt/flash/EOS.swi" ] )
+      try:
+         os.rename( "/mnt/flash/EOS.swi.bak", "/mnt/flash/EOS.swi" )
+      except OSError as renameErr:
+         log("Failed to restore original swi, err - %s" % renameErr)
       log("Failed to download swi from %s, err - %s" % (eosUrl, err.output))
       log("Falling back to original version")
       raise( err )
-   subprocess.call( [ "rm", "/mnt/flash/EOS.swi.bak" ] )
+   try:
+      os.unlink( "/mnt/flash/EOS.swi.bak" )
+   except OSError:
+      pass
+   flushLogger()
    subprocess.call( [ "reboot" ] )
 
 
@@ -242,8 +369,12 @@ class BootstrapManager( object ):
    def __init__( self ):
       super( BootstrapManager, self ).__init__()
       self.redirectorURL = None
+      self.redirectorURLStr = None
       self.tokenType = None
       self.enrollAddr = None
+      self.session = None
+      self.softwareVersion = getValueFromFile( "/etc/swi-version", "SWI_VERSION" )
+      self.architecture = getValueFromFile( "/etc/arch", "" )
 
    def getBootstrapURL( self, addr ):
       # urlparse in py3 parses correctly only if the url is properly introduced by //
@@ -275,30 +406,28 @@ class BootstrapManager( object ):
       # A timeout of 60 seconds is used with TerminAttr commands since in most
       # versions of TerminAttr, the command execution does not finish if a wrong
       # flag is specified leading to the catch block being never executed
-      cmd = "timeout 60s "
-      cmd += "/usr/bin/TerminAttr"
-      cmd += " -cvauth " + self.tokenType + "," + TOKEN_FILE_PATH
-      cmd += " -cvaddr " + self.enrollAddr
-      cmd += " -enrollonly"
+      args = [ "/usr/bin/TerminAttr",
+               "-cvauth", self.tokenType + "," + TOKEN_FILE_PATH,
+               "-cvaddr", self.enrollAddr,
+               "-enrollonly" ]
 
       # Use cvproxy only when it is specified, this is to ensure that if we are on
       # older version of EOS that doesn't support cvporxy flag, the script won't fail
       if cvproxy != "":
-         cmd += " -cvproxy=" + cvproxy
+         args.append( "-cvproxy=" + cvproxy )
 
       try:
-         subprocess.check_output( cmd, shell=True, stderr=subprocess.STDOUT )
-      except subprocess.CalledProcessError as e:
+         checkOutputWithTimeout( args, TERMINATTR_TIMEOUT )
+      except CommandTimeout as e:
          # If the above subprocess call times out, it means that -cvproxy
          # flag is not present in the Terminattr version running on that device
          # Hence we have to do an image upgrade in this case.
-         if e.returncode == 124: # timeout
-            log("terminattr enrollment timed out, err - %s" % e.output)
-            log("Attempting EOS version upgrade")
-            tryImageUpgrade( e )
-         else:
-            log("Failed to retrieve certs, err - %s" % e.output )
-            raise e
+         log("terminattr enrollment timed out, err - %s" % e.output)
+         log("Attempting EOS version upgrade")
+         tryImageUpgrade( e )
+      except subprocess.CalledProcessError as e:
+         log("Failed to retrieve certs, err - %s" % e.output )
+         raise e
 
       log("step 1 done, exchanged enrollment token for client certificates")
 
@@ -308,18 +437,15 @@ class BootstrapManager( object ):
 ##################################################################################
    def getCertificatePaths( self ):
       # Timeout added for TerminAttr
-      cmd = "timeout 60s "
-      cmd += "/usr/bin/TerminAttr"
-      cmd += " -cvaddr " + self.enrollAddr
-      cmd += " -certsconfig"
+      args = [ "/usr/bin/TerminAttr", "-cvaddr", self.enrollAddr, "-certsconfig" ]
 
       try:
-         response = subprocess.check_output( cmd, shell=True, stderr=subprocess.STDOUT,
-         universal_newlines=True )
+         # output is kept as bytes, json.loads (orjson or stdlib) parses it directly
+         response = checkOutputWithTimeout( args, TERMINATTR_TIMEOUT )
          json_response = json.loads( response )
          self.certificate = str( json_response[ self.enrollAddr ][ 'certFile' ] )
          self.key = str( json_response[ self.enrollAddr ][ 'keyFile' ] )
-      except subprocess.CalledProcessError:
+      except ( subprocess.CalledProcessError, CommandTimeout ):
          log("Using fallback paths for client certs")
          basePath = "/persist/secure/ssl/terminattr/primary/"
          self.certificate = basePath + "certs/client.crt"
@@ -329,6 +455,18 @@ class BootstrapManager( object ):
       log("certificate location - %s " % self.certificate )
       log("key location - %s " % self.key )
 
+   # A single session is shared by the redirector and bootstrap requests so that
+   # the connection, and with it the TLS handshake, is reused between them.
+   # Note: proxies are passed on each request rather than set on the session, as
+   # environment proxies would otherwise take precedence over cvproxy
+   def setupSession( self ):
+      self.session = requests.Session()
+      self.session.cert = ( self.certificate, self.key )
+      self.session.headers.update( { 'X-Arista-CustomBootScriptVersion': VERSION } )
+      adapter = requests.adapters.HTTPAdapter( pool_connections=1, pool_maxsize=2 )
+      self.session.mount( "https://", adapter )
+      self.session.mount( "http://", adapter )
+
 
 ##################################################################################
 # step 3 get bootstrap script using the certificates
@@ -338,13 +476,14 @@ class BootstrapManager( object ):
          return
 
       try:
-         payload = '{"key": {"system_id": "%s"}}' % serialNum
-         response = requests.post( self.redirectorURL.geturl(), data=payload,
-               cert=( self.certificate, self.key ), proxies=proxies )
+         payload = json.dumps( { "key": { "system_id": str( serialNum ) } } )
+         response = self.session.post( self.redirectorURLStr, data=payload, proxies=proxies,
+                                       headers={ 'Content-Type': 'application/json' } )
          response.raise_for_status()
-         clusters = response.json()[ 0 ][ "value" ][ "clusters" ][ "values" ]
+         clusters = json.loads( response.content )[ 0 ][ "value" ][ "clusters" ][ "values" ]
          assignment = clusters [ 0 ][ "hosts" ][ "values" ][ 0 ]
          self.bootstrapURL = self.getBootstrapURL( assignment )
+         self.bootstrapURLStr = self.bootstrapURL.geturl()
       except Exception as e:
          log("No assignment found. Error talking to redirector - %s" % e )
          raise e
@@ -359,11 +498,14 @@ class BootstrapManager( object ):
       mibStatus = pathHelper.getEntity( "hardware/entmib" )
 
       # setting header information
-      headers = {}
-      headers[ 'X-Arista-SystemMAC' ] = mibStatus.systemMacAddr
-      headers[ 'X-Arista-ModelName' ] = mibStatus.root.modelName
-      headers[ 'X-Arista-HardwareVersion' ] = mibStatus.root.hardwareRev
-      headers[ 'X-Arista-Serial' ] = mibStatus.root.serialNum
+      headers = {
+         'X-Arista-SystemMAC': mibStatus.systemMacAddr,
+         'X-Arista-ModelName': mibStatus.root.modelName,
+         'X-Arista-HardwareVersion': mibStatus.root.hardwareRev,
+         'X-Arista-Serial': mibStatus.root.serialNum,
+         'X-Arista-SoftwareVersion': self.softwareVersion,
+         'X-Arista-Architecture': self.architecture,
+      }
 
       try:
          tpmStatus = pathHelper.getEntity( "cell/" + cellID + "/hardware/tpm/status" )
@@ -373,38 +515,46 @@ class BootstrapManager( object ):
       except Exception as e:
          log("Exception while getting device tpmStatus: %s" % e)
 
-      headers[ 'X-Arista-SoftwareVersion' ] = getValueFromFile(
-            "/etc/swi-version", "SWI_VERSION" )
-      headers[ 'X-Arista-Architecture' ] = getValueFromFile( "/etc/arch", "" )
-      headers[ 'X-Arista-CustomBootScriptVersion' ] = VERSION
-
       # get the URL to the right cluster
       self.checkWithRedirector( mibStatus.root.serialNum )
 
       # making the request and writing to file
-      response = requests.get( self.bootstrapURL.geturl(), headers=headers,
-            cert=( self.certificate, self.key ), proxies=proxies )
-      response.raise_for_status()
-      with open( BOOT_SCRIPT_PATH, "w" ) as f:
-         f.write( response.text )
+      # the response is streamed to the file as bytes rather than decoded in memory
+      response = self.session.get( self.bootstrapURLStr, headers=headers, proxies=proxies,
+                                   stream=True )
+      try:
+         response.raise_for_status()
+         response.raw.decode_content = True
+         with open( BOOT_SCRIPT_PATH, "wb" ) as f:
+            shutil.copyfileobj( response.raw, f, 64 * 1024 )
+      finally:
+         response.close()
 
       log("step 3.1 done, bootstrap script fetched and stored at %s" % BOOT_SCRIPT_PATH)
 
    # execute the obtained bootstrap file
    def executeBootstrap( self ):
       proc = None
+      pidfd = None
       def handleSigterm( sig, frame ):
-         if proc is not None:
+         # signalling through the pidfd cannot hit another process that reused
+         # the pid, it fails instead once the child has been reaped, which is
+         # ignored just like proc.terminate() does
+         if pidfd is not None:
+            try:
+               signal.pidfd_send_signal( pidfd, signal.SIGTERM ) # pylint: disable=no-member
+            except OSError:
+               pass
+         elif proc is not None:
             proc.terminate()
          sys.exit( 127 + signal.SIGTERM )
       # The bootstrap script and challenge script anyway contain the required shebang for a
       # particualar EOS version, hence instead of re-evaluating here, we can easily just execute
       # it from that shebang itself.
-      cmd = [ "chmod +x " + BOOT_SCRIPT_PATH ]
       try:
-         subprocess.check_output( cmd, shell=True, stderr=subprocess.STDOUT )
-      except subprocess.CalledProcessError as e:
-         log(e.output)
+         os.chmod( BOOT_SCRIPT_PATH, 0o755 )
+      except OSError as e:
+         log("Failed to set execution permissions for bootstrap script - %s" % e)
          raise e
       log("step 3.2.1 done, execution permissions for bootstrap script setup")
 
@@ -412,9 +562,23 @@ class BootstrapManager( object ):
       os.environ['CVPROXY'] = cvproxy
       try:
          signal.signal( signal.SIGTERM, handleSigterm )
+         flushLogger()
          proc = subprocess.Popen( [ cmd ], shell=True, stderr=subprocess.STDOUT,
                                   env=os.environ )
-         proc.communicate()
+         # Wait on a pidfd when supported (python 3.9+, linux 5.3+), it becomes
+         # readable once the child exits. Fall back to communicate() otherwise.
+         pidfd = openPidfd( proc.pid )
+         if pidfd is not None:
+            try:
+               poller = select.poll()
+               poller.register( pidfd, select.POLLIN )
+               poller.poll()
+               proc.wait()
+            finally:
+               fd, pidfd = pidfd, None
+               os.close( fd )
+         else:
+            proc.communicate()
          if proc.returncode:
             log("Bootstrap script failed with return code {}".format(proc.returncode))
             sys.exit( proc.returncode )
@@ -425,8 +589,12 @@ class BootstrapManager( object ):
 
    def run( self ):
       self.getClientCertificates()
+      flushLogger()
       self.getCertificatePaths()
+      flushLogger()
+      self.setupSession()
       self.getBootstrapScript()
+      flushLogger()
       self.executeBootstrap()
 
 
@@ -436,6 +604,8 @@ class CloudBootstrapManager( BootstrapManager ):
 
       self.bootstrapURL = self.getBootstrapURL( cvAddr )
       self.redirectorURL = self.bootstrapURL._replace( path=REDIRECTOR_PATH )
+      self.bootstrapURLStr = self.bootstrapURL.geturl()
+      self.redirectorURLStr = self.redirectorURL.geturl()
       self.tokenType = SECURE_TOKEN
       self.enrollAddr = self.bootstrapURL.netloc + ":" + SECURE_HTTPS_PORT
       self.enrollAddr = self.enrollAddr.replace( "www", "apiserver" )
@@ -447,11 +617,14 @@ class OnPremBootstrapManager( BootstrapManager ):
 
       self.bootstrapURL = self.getBootstrapURL( cvAddr )
       self.redirectorURL = None
+      self.bootstrapURLStr = self.bootstrapURL.geturl()
+      self.redirectorURLStr = None
       self.tokenType = INGEST_TOKEN
       self.enrollAddr = self.bootstrapURL.netloc
 
 if __name__ == "__main__":
    setupLogger()
+   signal.signal( signal.SIGTERM, exitOnSigterm )
 
    #logging the current version of the custom bootstrap script
    log( "Current Custom Bootstrap Script Version :%s" % VERSION )
@@ -468,6 +641,7 @@ if __name__ == "__main__":
    # restart ntp process in case a ntpServer value is passed.
    if ntpServer != "":
       configureAndRestartNTP(ntpServer)
+      flushLogger()
 
    # check for enrollment token expiry
    expiryEpoch, parseSuccess = getExpiryFromToken(enrollmentToken)